@@ -0,0 +1,201 @@
+import os
+import json
+import asyncio
+import threading
+import hashlib
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from langchain_core.messages import AIMessageChunk
+
+try:
+    import chromadb
+except ImportError:  # 임베딩 기반 유사도 캐시는 선택 사항
+    chromadb = None
+
+logger = logging.getLogger(__name__)
+
+# 임베딩 유사도(코사인) 기준
+SIMILARITY_THRESHOLD = 0.97
+
+
+class CachedLLM:
+    """LLM 응답 캐시 래퍼
+
+    1단계: 모델 설정(model/max_tokens/response_format) + 프롬프트 SHA-256 기반 정확 일치 캐시
+    2단계: chromadb가 설치된 경우 임베딩 유사도 기반 캐시
+           (프롬프트 전체가 아닌 호출자가 준 변수 부분만 임베딩하고,
+            verify_fields가 모두 같은 항목만 재사용)
+    """
+
+    def __init__(self, llm, cache_dir: str = ".llm_cache", use_semantic: bool = True):
+        self.llm = llm
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # 응답은 한 줄에 하나씩 추가 기록 (저장할 때마다 전체 파일을 다시 쓰지 않음)
+        self._cache_path = os.path.join(cache_dir, "responses.jsonl")
+        self._write_lock = threading.Lock()
+        self._cache: Dict[str, str] = self._load_cache()
+        self._collection = self._init_collection() if use_semantic else None
+
+    def _load_cache(self) -> Dict[str, str]:
+        """디스크에 저장된 응답 캐시 로드"""
+        cache: Dict[str, str] = {}
+        if not os.path.exists(self._cache_path):
+            return cache
+        try:
+            with open(self._cache_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:  # 중간에 끊긴 줄은 건너뜀
+                        continue
+                    cache[entry["key"]] = entry["content"]
+        except OSError:
+            logger.warning("LLM 캐시 파일 로드 실패 - 빈 캐시로 시작")
+        return cache
+
+    def _init_collection(self):
+        """임베딩 유사도 검색용 chromadb 컬렉션 생성"""
+        if chromadb is None:
+            logger.info("chromadb 미설치 - 정확 일치 캐시만 사용")
+            return None
+        client = chromadb.PersistentClient(path=self.cache_dir)
+        return client.get_or_create_collection(
+            "llm_prompts", metadata={"hnsw:space": "cosine"}
+        )
+
+    def _response_format(self, kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """호출 인자 또는 모델 기본값의 response_format"""
+        model_kwargs = getattr(self.llm, "model_kwargs", None) or {}
+        return kwargs.get("response_format", model_kwargs.get("response_format"))
+
+    def _settings_id(self, kwargs: Dict[str, Any]) -> str:
+        """응답에 영향을 주는 모델 설정의 식별자 (설정이 바뀌면 이전 캐시를 쓰지 않도록)"""
+        settings = {
+            "model": getattr(self.llm, "model_name", None),
+            "max_tokens": kwargs.get("max_tokens", getattr(self.llm, "max_tokens", None)),
+            "response_format": self._response_format(kwargs),
+        }
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _make_key(settings_id: str, prompt: str) -> str:
+        return hashlib.sha256(f"{settings_id}\n{prompt}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _verify(verify_fields: Dict[str, str], cached_fields: Dict[str, Any]) -> bool:
+        """유사 일치 검증: 차종/버전/제어보드 등 지정 필드가 모두 같아야 재사용"""
+        return all(cached_fields.get(k) == v for k, v in verify_fields.items())
+
+    def _semantic_lookup(
+        self, semantic_text: Optional[str], verify_fields: Optional[Dict[str, str]]
+    ) -> Optional[str]:
+        """유사 입력의 캐시된 응답 검색 (검증 필드가 없으면 유사 매칭하지 않음)"""
+        if self._collection is None or not semantic_text or not verify_fields:
+            return None
+        if self._collection.count() == 0:
+            return None
+
+        conditions = [{k: v} for k, v in verify_fields.items()]
+        result = self._collection.query(
+            query_texts=[semantic_text],
+            n_results=1,
+            where={"$and": conditions} if len(conditions) > 1 else conditions[0],
+        )
+        if not result["ids"][0]:
+            return None
+
+        similarity = 1 - result["distances"][0][0]
+        if similarity < SIMILARITY_THRESHOLD:
+            return None
+        if not self._verify(verify_fields, result["metadatas"][0][0]):
+            return None
+
+        logger.info(f"LLM 캐시 유사 일치 (유사도 {similarity:.3f})")
+        return self._cache.get(result["ids"][0][0])
+
+    def _store(
+        self,
+        key: str,
+        content: str,
+        semantic_text: Optional[str],
+        verify_fields: Optional[Dict[str, str]],
+    ) -> None:
+        """응답을 메모리/디스크 캐시에 저장 (이벤트 루프 밖의 스레드에서 호출)"""
+        self._cache[key] = content
+
+        line = json.dumps({"key": key, "content": content}, ensure_ascii=False)
+        with self._write_lock, open(self._cache_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+        if self._collection is not None and semantic_text and verify_fields:
+            self._collection.upsert(
+                ids=[key], documents=[semantic_text], metadatas=[verify_fields]
+            )
+
+    def _lookup(
+        self,
+        key: str,
+        semantic_text: Optional[str],
+        verify_fields: Optional[Dict[str, str]],
+    ) -> Optional[str]:
+        """정확 일치 -> 유사 일치 순으로 캐시 조회"""
+        if key in self._cache:
+            logger.info("LLM 캐시 정확 일치")
+            return self._cache[key]
+        return self._semantic_lookup(semantic_text, verify_fields)
+
+    async def astream(
+        self,
+        prompt: str,
+        semantic_text: Optional[str] = None,
+        verify_fields: Optional[Dict[str, str]] = None,
+        validate: Optional[Callable[[str], bool]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[AIMessageChunk]:
+        """스트리밍 호출 (캐시 히트 시 전체 응답을 한 청크로 반환)
+
+        semantic_text/verify_fields를 주면 유사 캐시도 사용한다.
+        semantic_text는 프롬프트의 변수 부분만, verify_fields는 재사용 시 반드시
+        같아야 하는 값들이다. validate를 주면 그 검사를 통과한 응답만 캐시한다
+        (형식이 틀린 응답이 캐시되면 같은 프롬프트로 재시도해도 계속 같은 응답이 반환됨).
+        """
+        settings_id = self._settings_id(kwargs)
+        key = self._make_key(settings_id, prompt)
+        if verify_fields:
+            verify_fields = {**verify_fields, "settings": settings_id}
+
+        # 임베딩 검색/디스크 기록은 블로킹 작업이므로 스레드에서 수행
+        cached = await asyncio.to_thread(self._lookup, key, semantic_text, verify_fields)
+        if cached is not None:
+            yield AIMessageChunk(content=cached)
+            return
+
+        parts = []
+        finish_reason = None
+        async for chunk in self.llm.astream(prompt, **kwargs):
+            parts.append(chunk.content)
+            finish_reason = chunk.response_metadata.get("finish_reason") or finish_reason
+            yield chunk
+
+        content = "".join(parts)
+        if not self._is_cacheable(content, finish_reason, kwargs):
+            logger.warning(f"LLM 응답 캐시 생략 (finish_reason={finish_reason})")
+            return
+        if validate is not None and not validate(content):
+            logger.warning("LLM 응답 캐시 생략 (응답 검증 실패)")
+            return
+        await asyncio.to_thread(self._store, key, content, semantic_text, verify_fields)
+
+    def _is_cacheable(self, content: str, finish_reason: Optional[str], kwargs: Dict[str, Any]) -> bool:
+        """잘린 응답이나 JSON 모드인데 파싱되지 않는 응답은 캐시하지 않음"""
+        if finish_reason == "length":
+            return False
+        response_format = self._response_format(kwargs) or {}
+        if response_format.get("type") == "json_object":
+            try:
+                json.loads(content)
+            except json.JSONDecodeError:
+                return False
+        return True
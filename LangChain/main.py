@@ -1,14 +1,29 @@
 import os
-import json
+import asyncio
 import re
+import functools
+import time
+import orjson
+import jinja2
+import httpx
 from dotenv import load_dotenv
 from datetime import datetime
-from typing import Dict, Any, TypedDict
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
+from collections import ChainMap
+from typing import Callable, Dict, Any, List, Optional, Set, TypedDict
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
-from prompt import EMAIL_GENERATION_PROMPT, ACCURACY_CHECK_PROMPT
+from langgraph.checkpoint.memory import MemorySaver
+from prompt import (
+    GENERATE_AND_SCORE_PROMPT,
+    GENERATE_AND_SCORE_CACHE_KEY,
+    EMAIL_GENERATION_BATCH_PROMPT,
+    EMAIL_BATCH_ITEM_PROMPT,
+    REVISION_PROMPT
+)
+from llm_cache import CachedLLM
+from templates import HTML_SRC, SUMMARY_SRC
 import logging
+from uuid import uuid4
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +32,34 @@ logger = logging.getLogger(__name__)
 # 환경 변수 로드
 load_dotenv()
 
+# 전송 승인 기준 점수 및 최대 재작성 횟수
+ACCURACY_THRESHOLD = 95
+MAX_REVISIONS = 3
+
+# 입력 파싱: "차종, 버전, 제어보드" (쉼표 또는 공백 구분)
+INPUT_PATTERN = re.compile(
+    r"\s*(?P<vehicle_model>[^,]+?)\s*[,\s]\s*"
+    r"(?P<software_version>[vV]?\d[^,\s]*)\s*[,\s]\s*"
+    r"(?P<control_board>[^,\s]+)\s*"
+)
+
+# 입력에 없는 필드의 기본값
+DEFAULT_FIELDS = {
+    "manager_name": "김테스트",
+    "distributor_name": "박배포",
+    "test_result": "All Pass"
+}
+
+# 생성 모델 및 이메일 1건당 최대 응답 토큰 (이메일 + 점수 JSON)
+GENERATION_MODEL = "gpt-4o-mini"
+MAX_RESPONSE_TOKENS = 1024
+# 생성 모델의 최대 출력 토큰 (배치 응답이 이 한도를 넘지 않도록 배치 크기를 제한)
+MODEL_MAX_OUTPUT_TOKENS = 16384
+MAX_BATCH_SIZE = MODEL_MAX_OUTPUT_TOKENS // MAX_RESPONSE_TOKENS
+
+# OpenAI API 연결 풀 설정 (TLS 핸드셰이크를 요청 간에 재사용)
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=64, keepalive_expiry=60)
+
 # 상태 정의
 class EmailState(TypedDict):
     user_input: str
@@ -24,285 +67,540 @@ class EmailState(TypedDict):
     generated_email: str
     accuracy_score: Dict[str, Any]
     send_status: str
-    result_summary: str
     processing_time: str
     current_date: str
+    run_id: str
+    output_path: str
+    retry_count: int
 
 
 
 class EmailGenerationSystem:
     def __init__(self, openai_api_key: str):
-        self.llm = ChatOpenAI(
-            openai_api_key=openai_api_key,
-            model="gpt-3.5-turbo",
-            temperature=0
-        )
+        self._openai_api_key = openai_api_key
+        # 비동기 HTTP 클라이언트(연결 풀)는 이벤트 루프에 묶이므로 실행 중인 루프에서 필요할 때 생성
+        # (동기 클라이언트는 두지 않음: 모든 LLM 호출은 astream을 사용)
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.llm = CachedLLM(self._create_chat_model(), cache_dir=".llm_cache")
+        # 프롬프트 템플릿은 한 번만 준비해두고 노드에서는 format_map만 수행
+        self._generate_tpl = GENERATE_AND_SCORE_PROMPT
+        self._batch_tpl = EMAIL_GENERATION_BATCH_PROMPT
+        self._batch_item_tpl = EMAIL_BATCH_ITEM_PROMPT
+        self._revision_tpl = REVISION_PROMPT
+        # 결과 템플릿은 한 번만 컴파일 (autoescape로 사용자 입력 HTML 삽입 방지)
+        self._env = jinja2.Environment(autoescape=True)
+        self._html_tpl = self._env.from_string(HTML_SRC)
+        self._summary_tpl = self._env.from_string(SUMMARY_SRC)
         self.graph = self._build_graph()
+        # 체크포인터는 모든 인스턴스가 공유하므로, 이 인스턴스가 남긴(실패한) 스레드를 추적해 close()에서 삭제
+        self._failed_threads: Set[str] = set()
     
-    def _build_graph(self) -> StateGraph:
-        """LangGraph 워크플로우 구성"""
+    def _create_chat_model(self, http_async_client: Optional[httpx.AsyncClient] = None):
+        """ChatOpenAI 생성 (http_async_client가 없으면 langchain 기본 클라이언트 사용)"""
+        # langchain_openai는 무거운 모듈이므로 실제로 필요할 때만 로드
+        from langchain_openai import ChatOpenAI
+        
+        return ChatOpenAI(
+            openai_api_key=self._openai_api_key,
+            model=GENERATION_MODEL,
+            temperature=0,
+            # JSON 모드: 응답이 항상 파싱 가능한 JSON 객체로 오도록 강제
+            model_kwargs={"response_format": {"type": "json_object"}},
+            http_async_client=http_async_client
+        )
+    
+    def _ensure_http(self) -> None:
+        """현재 실행 중인 루프에 묶인 연결 풀 준비 (루프가 바뀌면 새로 생성)"""
+        loop = asyncio.get_running_loop()
+        if self._async_http is not None and self._http_loop is loop:
+            return
+        self._async_http = httpx.AsyncClient(limits=HTTP_LIMITS)
+        self._http_loop = loop
+        self.llm.llm = self._create_chat_model(self._async_http)
+    
+    async def _release_http(self) -> None:
+        """현재 루프의 연결 풀 정리 (다른 루프에서 만든 풀은 그 루프에서만 닫을 수 있으므로 참조만 해제)"""
+        if self._async_http is not None and self._http_loop is asyncio.get_running_loop():
+            await self._async_http.aclose()
+        self._async_http = None
+        self._http_loop = None
+    
+    @classmethod
+    @functools.lru_cache(maxsize=1)
+    def _build_graph(cls) -> StateGraph:
+        """LangGraph 워크플로우 구성 (클래스당 한 번만 컴파일하여 모든 인스턴스가 공유)"""
         workflow = StateGraph(EmailState)
         
-        # 노드 추가
-        workflow.add_node("input_processing", self.process_input)
-        workflow.add_node("email_generation", self.generate_email)
-        workflow.add_node("accuracy_check", self.check_accuracy)
-        workflow.add_node("email_simulation", self.simulate_email_send)
-        workflow.add_node("result_output", self.output_result)
-        workflow.add_node("web_update", self.update_web_page)
-        workflow.add_node("revision", self.revise_email)
+        # 노드 추가 (실행할 인스턴스는 호출 시 config로 전달)
+        workflow.add_node("input_processing", cls._bind_node("process_input"))
+        workflow.add_node("generate_and_score", cls._bind_node("generate_and_score"))
+        workflow.add_node("email_simulation", cls._bind_node("simulate_email_send"))
+        workflow.add_node("result_output", cls._bind_node("output_result"))
+        workflow.add_node("web_update", cls._bind_node("update_web_page"))
+        workflow.add_node("revision", cls._bind_node("revise_email"))
+        workflow.add_node("revised_email", cls._bind_node("generate_revised_email"))
+        workflow.add_node("send_failed", cls._bind_node("mark_send_failed"))
         
         # 엣지 연결
         workflow.set_entry_point("input_processing")
-        workflow.add_edge("input_processing", "email_generation")
-        workflow.add_edge("email_generation", "accuracy_check")
+        workflow.add_edge("input_processing", "generate_and_score")
+        
+        # 조건부 라우팅 (최초 생성/재작성 모두 같은 기준으로 판단)
+        for node in ("generate_and_score", "revised_email"):
+            workflow.add_conditional_edges(
+                node,
+                cls.should_send_email,
+                {
+                    "send": "email_simulation",
+                    "revise": "revision",
+                    "give_up": "send_failed"
+                }
+            )
         
-        # 조건부 라우팅
+        # 직전 응답 파싱에 실패해 고칠 이메일이 없으면 재작성 대신 처음부터 다시 생성
         workflow.add_conditional_edges(
-            "accuracy_check",
-            self.should_send_email,
+            "revision",
+            cls.route_revision,
             {
-                "send": "email_simulation",
-                "revise": "revision"
+                "regenerate": "generate_and_score",
+                "patch": "revised_email"
             }
         )
-        
-        workflow.add_edge("revision", "email_generation")
         workflow.add_edge("email_simulation", "result_output")
+        workflow.add_edge("send_failed", "result_output")
         workflow.add_edge("result_output", "web_update")
         workflow.add_edge("web_update", END)
         
-        return workflow.compile()
+        # 체크포인터: 노드 단위로 상태를 저장하여 중단/재개 가능
+        # (모든 인스턴스가 공유하므로 완료된 스레드는 _invoke에서, 실패한 스레드는 close()에서 삭제)
+        return workflow.compile(checkpointer=MemorySaver())
+    
+    @staticmethod
+    def _bind_node(method_name: str):
+        """config["configurable"]["system"] 인스턴스의 메서드를 호출하는 그래프 노드 생성"""
+        async def node(state: EmailState, config: RunnableConfig) -> Dict[str, Any]:
+            system = config["configurable"]["system"]
+            return await getattr(system, method_name)(state)
+        
+        node.__name__ = method_name
+        return node
     
-    def process_input(self, state: EmailState) -> EmailState:
+    async def process_input(self, state: EmailState) -> Dict[str, Any]:
         """입력 처리 및 파싱"""
         logger.info("입력 처리 시작")
         
         user_input = state["user_input"]
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        
-        # 간단한 파싱 로직 (실제로는 더 정교하게 구현)
-        parsed_data = {
-            "vehicle_model": "추출된차종",
-            "software_version": "추출된버전", 
-            "control_board": "추출된제어보드",
-            "manager_name": "김테스트",
-            "distributor_name": "박배포",
-            "test_result": "All Pass"
-        }
         
-        state.update({
-            "parsed_data": parsed_data,
-            "current_date": current_date,
-            "processing_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
+        # 실행당 한 번만 시각을 구해 이후 노드에서 재사용
+        now = datetime.now()
+        current_date = now.date().isoformat()
+        processing_time = now.isoformat(sep=" ", timespec="seconds")
+        
+        # 정규식 파싱 (형식이 맞지 않으면 빈 값으로 두고 LLM이 입력 내용에서 추출)
+        match = INPUT_PATTERN.fullmatch(user_input)
+        if match:
+            extracted = match.groupdict()
+        else:
+            logger.warning(f"입력 형식 불일치 - 파싱 생략: {user_input}")
+            extracted = {"vehicle_model": "", "software_version": "", "control_board": ""}
+        parsed_data = {**extracted, **DEFAULT_FIELDS}
         
         logger.info(f"파싱 완료: {parsed_data}")
-        return state
+        return {
+            "parsed_data": parsed_data,
+            "current_date": current_date,
+            "processing_time": processing_time
+        }
     
-    def generate_email(self, state: EmailState) -> EmailState:
-        """이메일 생성"""
-        logger.info("이메일 생성 시작")
+    async def generate_and_score(self, state: EmailState) -> Dict[str, Any]:
+        """이메일 생성 및 정확도 검증 (단일 LLM 호출)"""
+        logger.info("이메일 생성 및 정확도 체크 시작")
         
-        prompt = PromptTemplate.from_template(EMAIL_GENERATION_PROMPT)
+        formatted_prompt = self._generate_tpl.format_map(ChainMap(
+            state["parsed_data"],
+            {"user_input": state["user_input"], "current_date": state["current_date"]}
+        ))
         
-        formatted_prompt = prompt.format(
-            user_input=state["user_input"],
-            current_date=state["current_date"],
-            **state["parsed_data"]
-        )
+        # 유사 캐시는 차종/버전/제어보드가 파싱된 경우에만, 그 값과 날짜가 모두 같을 때만 재사용
+        parsed_data = state["parsed_data"]
+        verify_fields = None
+        if all(parsed_data.get(k) for k in ("vehicle_model", "software_version", "control_board")):
+            verify_fields = {
+                **parsed_data,
+                "current_date": state["current_date"],
+                "prompt_version": GENERATE_AND_SCORE_CACHE_KEY
+            }
         
-        response = self.llm.invoke(formatted_prompt)
-        generated_email = response.content
+        content = await self._stream_response(
+            formatted_prompt,
+            semantic_text="\n".join([state["user_input"], *parsed_data.values()]),
+            verify_fields=verify_fields,
+            validate=self._accepts(self._parse_result)
+        )
         
-        state["generated_email"] = generated_email
-        logger.info("이메일 생성 완료")
-        return state
+        logger.info("이메일 생성 및 정확도 체크 완료")
+        return self._parse_email_and_score(content)
     
-    def check_accuracy(self, state: EmailState) -> EmailState:
-        """정확도 검증"""
-        logger.info("정확도 체크 시작")
+    async def generate_revised_email(self, state: EmailState) -> Dict[str, Any]:
+        """이전 이메일과 피드백을 바탕으로 이메일 재작성 및 재검증"""
+        logger.info("이메일 재작성 및 정확도 체크 시작")
+        
+        accuracy_score = state["accuracy_score"]
+        formatted_prompt = self._revision_tpl.format_map(ChainMap(
+            state["parsed_data"],
+            {
+                "user_input": state["user_input"],
+                "current_date": state["current_date"],
+                "previous_email": state["generated_email"],
+                "feedback": accuracy_score.get("feedback", "없음"),
+                "missing_elements": ", ".join(accuracy_score.get("missing_elements") or []) or "없음"
+            }
+        ))
         
-        prompt = PromptTemplate.from_template(ACCURACY_CHECK_PROMPT)
+        content = await self._stream_response(formatted_prompt, validate=self._accepts(self._parse_result))
         
-        formatted_prompt = prompt.format(
-            original_input=state["user_input"],
-            generated_email=state["generated_email"]
-        )
+        logger.info("이메일 재작성 및 정확도 체크 완료")
+        return self._parse_email_and_score(content)
+    
+    async def _stream_response(
+        self,
+        formatted_prompt: str,
+        max_tokens: int = MAX_RESPONSE_TOKENS,
+        semantic_text: Optional[str] = None,
+        verify_fields: Optional[Dict[str, str]] = None,
+        validate: Optional[Callable[[str], bool]] = None
+    ) -> str:
+        """LLM 응답을 스트리밍으로 수신하여 전체 내용 반환"""
+        started = time.perf_counter()
+        parts = []
         
-        response = self.llm.invoke(formatted_prompt)
+        # 생성/재작성/배치 프롬프트는 정적 프리픽스가 같으므로 같은 캐시 키로 라우팅
+        async for chunk in self.llm.astream(
+            formatted_prompt,
+            semantic_text=semantic_text,
+            verify_fields=verify_fields,
+            validate=validate,
+            max_tokens=max_tokens,
+            extra_body={"prompt_cache_key": GENERATE_AND_SCORE_CACHE_KEY}
+        ):
+            if not parts:
+                logger.info(f"첫 토큰 수신: {time.perf_counter() - started:.2f}초")
+            parts.append(chunk.content)
         
+        logger.info(f"응답 수신 완료: {time.perf_counter() - started:.2f}초")
+        return "".join(parts)
+    
+    def _parse_email_and_score(self, content: str) -> Dict[str, Any]:
+        """LLM 응답(JSON)을 이메일/점수 상태 변경분으로 분리"""
         try:
-            # JSON 파싱
-            accuracy_data = json.loads(response.content)
-            state["accuracy_score"] = accuracy_data
-            logger.info(f"정확도 점수: {accuracy_data['overall_score']}")
-        except json.JSONDecodeError:
-            logger.error("정확도 체크 응답 파싱 실패")
-            state["accuracy_score"] = {
-                "overall_score": 0,
-                "recommendation": "REVISE",
-                "feedback": "응답 파싱 실패"
+            result = self._parse_result(content)
+        except ValueError:  # orjson.JSONDecodeError도 ValueError 하위 클래스
+            # JSON 모드여도 max_tokens에 걸려 잘린 응답은 파싱되지 않으므로 빈 이메일로 두고 다시 생성하도록 보냄
+            logger.error("이메일 생성/정확도 체크 응답 파싱 실패")
+            return {
+                "generated_email": "",
+                "accuracy_score": {
+                    "overall_score": 0,
+                    "recommendation": "REVISE",
+                    "feedback": "응답 파싱 실패 (응답이 잘렸거나 형식이 올바르지 않음)"
+                }
             }
         
-        return state
+        logger.info(f"정확도 점수: {result['score']['overall_score']}")
+        return {
+            "generated_email": result["email"],
+            "accuracy_score": result["score"]
+        }
     
-    def should_send_email(self, state: EmailState) -> str:
+    @classmethod
+    def _parse_result(cls, content: str) -> Dict[str, Any]:
+        """단일 생성/재작성 응답 파싱 및 형식 검사 (실패 시 ValueError)"""
+        return cls._validate_result(orjson.loads(content))
+    
+    @classmethod
+    def _parse_batch_results(cls, content: str, batch_size: int) -> List[Dict[str, Any]]:
+        """배치 응답 파싱 및 항목별 형식 검사 (실패 시 ValueError/AttributeError)"""
+        results = orjson.loads(content).get("results")
+        if not isinstance(results, list) or len(results) != batch_size:
+            raise ValueError("배치 응답 개수 불일치")
+        # 항목 형식(score가 dict, overall_score가 숫자)까지 여기서 검사해야
+        # 이후 should_send_email에서 예외가 나지 않음
+        return [cls._validate_result(result) for result in results]
+    
+    @staticmethod
+    def _accepts(parse: Callable[[str], Any]) -> Callable[[str], bool]:
+        """parse가 예외 없이 통과하는 응답만 캐시하도록 하는 검증 함수 생성"""
+        def validate(content: str) -> bool:
+            try:
+                parse(content)
+            except (ValueError, AttributeError):
+                return False
+            return True
+        return validate
+    
+    @staticmethod
+    def _validate_result(result: Any) -> Dict[str, Any]:
+        """{"email": str, "score": {"overall_score": 숫자, ...}} 형식인지 검사"""
+        if not isinstance(result, dict):
+            raise ValueError("응답이 JSON 객체가 아님")
+        score = result.get("score")
+        if not isinstance(result.get("email"), str) or not isinstance(score, dict):
+            raise ValueError("email/score 필드 누락 또는 형식 오류")
+        overall_score = score.get("overall_score")
+        if isinstance(overall_score, bool) or not isinstance(overall_score, (int, float)):
+            raise ValueError("overall_score가 숫자가 아님")
+        return result
+    
+    @staticmethod
+    def should_send_email(state: EmailState) -> str:
         """이메일 전송 여부 결정"""
         score = state["accuracy_score"].get("overall_score", 0)
-        recommendation = state["accuracy_score"].get("recommendation", "REVISE")
         
-        if score == 100 and recommendation == "APPROVE":
-            logger.info("정확도 100점 - 이메일 전송 승인")
+        if score >= ACCURACY_THRESHOLD:
+            logger.info(f"정확도 {score}점 - 이메일 전송 승인")
+            return "send"
+        elif state["retry_count"] >= MAX_REVISIONS:
+            if not state["generated_email"]:
+                logger.error(f"재작성 {MAX_REVISIONS}회 초과 - 유효한 이메일이 없어 전송 중단")
+                return "give_up"
+            logger.warning(f"정확도 {score}점 - 재작성 {MAX_REVISIONS}회 초과, 현재 이메일로 전송")
             return "send"
         else:
             logger.info(f"정확도 {score}점 - 재작성 필요")
             return "revise"
     
-    def revise_email(self, state: EmailState) -> EmailState:
+    @staticmethod
+    def route_revision(state: EmailState) -> str:
+        """재작성 방식 결정 (고칠 이메일이 없으면 처음부터 다시 생성)"""
+        if not state["generated_email"]:
+            logger.info("이전 응답 파싱 실패 - 이메일 다시 생성")
+            return "regenerate"
+        return "patch"
+    
+    async def revise_email(self, state: EmailState) -> Dict[str, Any]:
         """이메일 재작성"""
-        logger.info("이메일 재작성")
+        retry_count = state["retry_count"] + 1
+        logger.info(f"이메일 재작성 ({retry_count}/{MAX_REVISIONS})")
         feedback = state["accuracy_score"].get("feedback", "")
-        # 실제로는 피드백을 반영한 재작성 로직 구현
-        # 현재는 단순히 로그만 출력
+        # 실제 재작성은 revised_email 노드에서 이전 이메일 + 피드백으로 수행
         logger.info(f"재작성 피드백: {feedback}")
-        return state
+        return {"retry_count": retry_count}
     
-    def simulate_email_send(self, state: EmailState) -> EmailState:
+    async def simulate_email_send(self, state: EmailState) -> Dict[str, Any]:
         """이메일 전송 시뮬레이션"""
         logger.info("이메일 전송 시뮬레이션")
         
         # 시뮬레이션 로직
-        state["send_status"] = "전송 완료 (시뮬레이션)"
+        send_status = "전송 완료 (시뮬레이션)"
         logger.info("이메일 전송 시뮬레이션 완료")
-        return state
+        return {"send_status": send_status}
     
-    def output_result(self, state: EmailState) -> EmailState:
+    async def mark_send_failed(self, state: EmailState) -> Dict[str, Any]:
+        """유효한 이메일 없이 재작성 한도에 도달한 경우 전송하지 않고 실패로 기록"""
+        return {"send_status": f"전송 안 함 (재작성 {MAX_REVISIONS}회 후에도 유효한 이메일 없음)"}
+    
+    async def output_result(self, state: EmailState) -> Dict[str, Any]:
         """결과 출력"""
         logger.info("결과 출력")
         
-        result_summary = f"""
-        📧 이메일 생성 완료 보고서
-        
-        ═══════════════════════════════════════
-        📝 처리 결과
-        - 상태: {state['send_status']}
-        - 정확도: {state['accuracy_score']['overall_score']}/100
-        - 처리 시간: {state['processing_time']}
+        result_summary = self._summary_tpl.render(state=state)
         
-        📋 생성된 이메일 정보
-        - 입력: {state['user_input']}
-        - 파싱된 데이터: {state['parsed_data']}
-        
-        📊 품질 평가
-        - 파싱 정확성: {state['accuracy_score'].get('parsing_accuracy', 'N/A')}/40
-        - 양식 준수: {state['accuracy_score'].get('format_compliance', 'N/A')}/30
-        - 필수 정보: {state['accuracy_score'].get('required_info', 'N/A')}/20
-        - 형식 완성도: {state['accuracy_score'].get('format_completeness', 'N/A')}/10
-        
-        💡 피드백: {state['accuracy_score'].get('feedback', '없음')}
-        ═══════════════════════════════════════
-        """
-        
-        state["result_summary"] = result_summary
+        # 요약은 출력만 하는 부수 효과로 두고 상태(체크포인트)에는 저장하지 않음
         print(result_summary)
-        return state
+        return {}
     
-    def update_web_page(self, state: EmailState) -> EmailState:
+    async def update_web_page(self, state: EmailState) -> Dict[str, Any]:
         """웹페이지 업데이트"""
         logger.info("웹페이지 업데이트")
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html lang="ko">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>이메일 생성 결과</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; background-color: #f5f5f5; }}
-                .container {{ max-width: 800px; margin: 0 auto; background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-                .header {{ background: #007bff; color: white; padding: 15px; border-radius: 5px; margin-bottom: 20px; }}
-                .section {{ margin-bottom: 20px; padding: 15px; border: 1px solid #ddd; border-radius: 5px; }}
-                .score {{ font-size: 24px; font-weight: bold; color: #28a745; }}
-                .email-content {{ background: #f8f9fa; padding: 15px; border-radius: 5px; white-space: pre-wrap; }}
-                .timestamp {{ color: #666; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🚗 자동차 테스트 이메일 생성 시스템</h1>
-                    <p>생성 시간: {state['processing_time']}</p>
-                </div>
-                
-                <div class="section">
-                    <h2>📝 처리 결과</h2>
-                    <p><strong>상태:</strong> {state['send_status']}</p>
-                    <p><strong>정확도:</strong> <span class="score">{state['accuracy_score']['overall_score']}/100</span></p>
-                </div>
-                
-                <div class="section">
-                    <h2>📋 입력 정보</h2>
-                    <p><strong>사용자 입력:</strong> {state['user_input']}</p>
-                    <p><strong>차종:</strong> {state['parsed_data']['vehicle_model']}</p>
-                    <p><strong>소프트웨어 버전:</strong> {state['parsed_data']['software_version']}</p>
-                    <p><strong>제어보드:</strong> {state['parsed_data']['control_board']}</p>
-                </div>
-                
-                <div class="section">
-                    <h2>📧 생성된 이메일</h2>
-                    <div class="email-content">{state['generated_email']}</div>
-                </div>
-                
-                <div class="section">
-                    <h2>📊 품질 평가</h2>
-                    <p><strong>파싱 정확성:</strong> {state['accuracy_score'].get('parsing_accuracy', 'N/A')}/40</p>
-                    <p><strong>양식 준수:</strong> {state['accuracy_score'].get('format_compliance', 'N/A')}/30</p>
-                    <p><strong>필수 정보:</strong> {state['accuracy_score'].get('required_info', 'N/A')}/20</p>
-                    <p><strong>형식 완성도:</strong> {state['accuracy_score'].get('format_completeness', 'N/A')}/10</p>
-                    <p><strong>피드백:</strong> {state['accuracy_score'].get('feedback', '없음')}</p>
-                </div>
-                
-                <div class="timestamp">
-                    마지막 업데이트: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        # 동시 실행 시 결과 파일이 겹치지 않도록 run_id별 파일명 사용
+        run_id = state["run_id"]
+        output_path = f"email_result_{run_id}.html" if run_id else "email_result.html"
         
-        # HTML 파일 저장
-        with open("email_result.html", "w", encoding="utf-8") as f:
-            f.write(html_content)
+        # 파일 I/O는 스레드에서 수행하여 동시 실행 중인 다른 그래프를 막지 않도록 함
+        await asyncio.to_thread(self._write_html, state, output_path)
         
-        logger.info("웹페이지 업데이트 완료: email_result.html")
-        return state
+        logger.info(f"웹페이지 업데이트 완료: {output_path}")
+        return {"output_path": output_path}
     
-    def run(self, user_input: str) -> Dict[str, Any]:
-        """시스템 실행"""
-        initial_state = EmailState(
+    def _write_html(self, state: EmailState, output_path: str) -> None:
+        """HTML을 문자열로 만들지 않고 파일로 바로 스트리밍"""
+        with open(output_path, "w", encoding="utf-8", buffering=1 << 16) as f:
+            self._html_tpl.stream(state=state).dump(f)
+    
+    def _initial_state(self, user_input: str, run_id: str = "") -> EmailState:
+        """초기 상태 생성"""
+        return EmailState(
             user_input=user_input,
             parsed_data={},
             generated_email="",
             accuracy_score={},
             send_status="",
-            result_summary="",
             processing_time="",
-            current_date=""
+            current_date="",
+            run_id=run_id,
+            output_path="",
+            retry_count=0
         )
+    
+    async def _invoke(self, state: Optional[EmailState], thread_id: Optional[str] = None) -> Dict[str, Any]:
+        """실행별 thread_id로 체크포인트를 분리하고, 노드가 사용할 인스턴스를 전달하여 그래프 실행
+        
+        state가 None이면 thread_id의 마지막 체크포인트부터 이어서 실행한다.
+        완료된 실행의 체크포인트는 삭제하고, 실패한 실행은 resume()으로 재개할 수 있도록 남긴다.
+        """
+        thread_id = thread_id or state["run_id"] or uuid4().hex
+        config = {"configurable": {"thread_id": thread_id, "system": self}}
+        try:
+            result = await self.graph.ainvoke(state, config=config)
+        except Exception:
+            self._failed_threads.add(thread_id)
+            logger.error(f"그래프 실행 실패 - resume(\"{thread_id}\")로 재개 가능")
+            raise
         
-        result = self.graph.invoke(initial_state)
+        self._failed_threads.discard(thread_id)
+        await self.graph.checkpointer.adelete_thread(thread_id)
         return result
+    
+    async def aresume(self, thread_id: str) -> Dict[str, Any]:
+        """실패한 실행을 마지막 체크포인트부터 재개"""
+        self._ensure_http()
+        return await self._invoke(None, thread_id)
+    
+    def resume(self, thread_id: str) -> Dict[str, Any]:
+        """aresume의 동기 래퍼"""
+        return asyncio.run(self._run_then_release(self.aresume(thread_id)))
+    
+    def _delete_failed_threads(self) -> None:
+        """공유 체크포인터에 남은 이 인스턴스의 (재개되지 않은) 스레드 삭제"""
+        for thread_id in self._failed_threads:
+            self.graph.checkpointer.delete_thread(thread_id)
+        self._failed_threads.clear()
+    
+    async def aclose(self) -> None:
+        """재개되지 않은 체크포인트와 현재 루프의 연결 풀 정리"""
+        self._delete_failed_threads()
+        await self._release_http()
+    
+    def close(self) -> None:
+        """재개되지 않은 체크포인트 정리 (동기 run()은 실행마다 연결 풀을 닫으므로 별도 정리 불필요)"""
+        self._delete_failed_threads()
+    
+    def __enter__(self) -> "EmailGenerationSystem":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    async def __aenter__(self) -> "EmailGenerationSystem":
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+    
+    async def _run_then_release(self, coro) -> Any:
+        """동기 래퍼용: 코루틴 실행 후 이번 루프에서 만든 연결 풀 정리"""
+        try:
+            return await coro
+        finally:
+            await self._release_http()
+    
+    def run(self, user_input: str) -> Dict[str, Any]:
+        """시스템 실행 (동기 래퍼, 실행 중인 이벤트 루프 안에서는 arun 사용)"""
+        return asyncio.run(self._run_then_release(self.arun(user_input)))
+    
+    async def arun(self, user_input: str) -> Dict[str, Any]:
+        """시스템 실행"""
+        self._ensure_http()
+        return await self._invoke(self._initial_state(user_input))
+    
+    async def run_many(self, inputs: List[str]) -> List[Dict[str, Any]]:
+        """여러 입력을 동시에 실행 (LLM 호출 대기 시간이 겹치도록)"""
+        self._ensure_http()
+        return await self._run_many(inputs)
+    
+    async def run_batch(self, inputs: List[str], batch_size: int = 8) -> List[Dict[str, Any]]:
+        """여러 입력을 배치 프롬프트로 묶어 실행 (배치당 LLM 호출 1회)"""
+        if batch_size < 1:
+            raise ValueError(f"batch_size는 1 이상이어야 함: {batch_size}")
+        if batch_size > MAX_BATCH_SIZE:
+            logger.warning(f"batch_size {batch_size} - 최대 출력 토큰 한도로 {MAX_BATCH_SIZE}로 제한")
+            batch_size = MAX_BATCH_SIZE
+        self._ensure_http()
+        return await self._run_batch(inputs, batch_size)
+    
+    async def _run_many(self, inputs: List[str]) -> List[Dict[str, Any]]:
+        states = [self._initial_state(user_input, uuid4().hex) for user_input in inputs]
+        return await asyncio.gather(*(self._invoke(s) for s in states))
+    
+    async def _run_batch(self, inputs: List[str], batch_size: int) -> List[Dict[str, Any]]:
+        shards = [inputs[i:i + batch_size] for i in range(0, len(inputs), batch_size)]
+        shard_results = await asyncio.gather(*(self._run_shard(shard) for shard in shards))
+        return [result for results in shard_results for result in results]
+    
+    async def _run_shard(self, shard: List[str]) -> List[Dict[str, Any]]:
+        """배치 하나를 단일 프롬프트로 생성/검증한 뒤 항목별 후속 처리"""
+        states = [self._initial_state(user_input, uuid4().hex) for user_input in shard]
+        for state in states:
+            state.update(await self.process_input(state))
+        
+        inputs_block = "\n".join(
+            self._batch_item_tpl.format_map(ChainMap(
+                state["parsed_data"],
+                {"index": index, "user_input": state["user_input"], "current_date": state["current_date"]}
+            ))
+            for index, state in enumerate(states, start=1)
+        )
+        formatted_prompt = self._batch_tpl.format(
+            batch_size=len(states),
+            inputs=inputs_block
+        )
+        
+        logger.info(f"배치 이메일 생성 및 정확도 체크 시작 ({len(states)}건)")
+        def parse(content: str) -> List[Dict[str, Any]]:
+            return self._parse_batch_results(content, len(states))
+        
+        content = await self._stream_response(
+            formatted_prompt,
+            MAX_RESPONSE_TOKENS * len(states),
+            validate=self._accepts(parse)
+        )
+        
+        try:
+            results = parse(content)
+            for state, result in zip(states, results):
+                state["generated_email"] = result["email"]
+                state["accuracy_score"] = result["score"]
+        except (ValueError, AttributeError):
+            logger.error("배치 응답 파싱 실패 - 개별 실행으로 전환")
+            return await self._run_many(shard)
+        
+        return await asyncio.gather(*(self._finish_batch_item(state) for state in states))
+    
+    async def _finish_batch_item(self, state: EmailState) -> Dict[str, Any]:
+        """배치 결과 항목별 전송/출력 (재작성이 필요하면 배치 결과에서 이어서 그래프 실행)"""
+        if self.should_send_email(state) == "revise":
+            # 배치에서 받은 이메일/피드백/파싱 결과를 generate_and_score의 출력으로 기록하고
+            # 그 다음 단계(revision -> revised_email)부터 재개하여 처음부터 다시 생성하지 않음
+            thread_id = state["run_id"]
+            await self.graph.aupdate_state(
+                {"configurable": {"thread_id": thread_id, "system": self}},
+                state,
+                as_node="generate_and_score"
+            )
+            return await self._invoke(None, thread_id)
+        
+        # 그래프 밖에서 실행하므로 노드가 반환한 변경분을 직접 병합
+        for node in (self.simulate_email_send, self.output_result, self.update_web_page):
+            state.update(await node(state))
+        return state
 
 # 실행 예제
 def main():
     # OpenAI API 키 설정 (환경변수 또는 직접 입력)
     api_key = os.getenv("OPENAI_API_KEY") 
     
-    # 시스템 초기화
-    email_system = EmailGenerationSystem(api_key)
-    
     # 테스트 실행
     test_input = "소나타, v2.1.3, ECU-2024"
     
@@ -310,10 +608,12 @@ def main():
     print(f"입력: {test_input}")
     print("=" * 50)
     
-    result = email_system.run(test_input)
+    # 시스템 초기화 (종료 시 남은 체크포인트 정리)
+    with EmailGenerationSystem(api_key) as email_system:
+        result = email_system.run(test_input)
     
     print("\n✅ 처리 완료!")
-    print("결과 파일: email_result.html")
+    print(f"결과 파일: {result['output_path']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
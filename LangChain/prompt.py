@@ -1,14 +1,21 @@
 # 프롬프트 템플릿들
-EMAIL_GENERATION_PROMPT = """
-당신은 자동차 소프트웨어 테스트 결과를 이메일로 작성하는 전문가입니다.
-주어진 입력을 파싱하여 아래의 고정된 양식에 맞춰 이메일을 작성해주세요.
+#
+# OpenAI 자동 프롬프트 캐시는 앞부분(약 1024 토큰)이 바이트 단위로 동일해야 적용된다.
+# 따라서 정적인 지침/예시를 앞에 두고, 변수 슬롯({user_input}, {current_date} 등)은
+# 모두 템플릿 맨 끝의 "작업 입력" 블록에만 둔다.
 
-**입력 내용:** {user_input}
+# 프롬프트 캐시 라우팅 키 (정적 구간이 바뀌면 버전을 올릴 것)
+GENERATE_AND_SCORE_CACHE_KEY = "email_gen_v2"
 
-**이메일 양식 (반드시 이 구조를 따라주세요):**
+# 단건/배치 프롬프트가 공유하는 정적 프리픽스 (변수 슬롯 없음)
+EMAIL_TASK_PREFIX = """
+당신은 자동차 소프트웨어 테스트 결과를 이메일로 작성하고, 작성한 이메일의 품질을 스스로 검증하는 전문가입니다.
+맨 아래 "작업 입력"을 파싱하여 아래의 고정된 양식에 맞춰 이메일을 작성한 뒤, 원본 입력과 비교하여 정확도를 평가해주세요.
+
+**이메일 양식 (반드시 이 구조를 따라주세요, <...> 부분은 작업 입력의 값으로 채웁니다):**
 
 ---
-**제목:** [{vehicle_model}] [{software_version}] [{control_board}] 테스트 결과 보고
+**제목:** [<차종>] [<소프트웨어 버전>] [<제어보드>] 테스트 결과 보고
 
 **수신자:** 개발팀, QA팀
 
@@ -17,15 +24,15 @@ EMAIL_GENERATION_PROMPT = """
 안녕하세요,
 
 **테스트 정보:**
-- **차종:** [{vehicle_model}]
-- **소프트웨어 버전:** [{software_version}]  
-- **제어보드:** [{control_board}]
-- **테스트 날짜:** {current_date}
+- **차종:** [<차종>]
+- **소프트웨어 버전:** [<소프트웨어 버전>]  
+- **제어보드:** [<제어보드>]
+- **테스트 날짜:** <테스트 날짜>
 
-**담당자:** {manager_name}
-**배포자:** {distributor_name}
+**담당자:** <담당자>
+**배포자:** <배포자>
 
-**테스트 결과:** {test_result}
+**테스트 결과:** <테스트 결과>
 
 **상세 내용:**
 위 사양에 대한 테스트가 완료되었습니다.
@@ -37,7 +44,7 @@ EMAIL_GENERATION_PROMPT = """
 감사합니다.
 
 **발신자:** 테스트팀
-**날짜:** {current_date}
+**날짜:** <테스트 날짜>
 ---
 
 **파싱 지침:**
@@ -45,16 +52,7 @@ EMAIL_GENERATION_PROMPT = """
 2. 각 필드를 대괄호 []로 감싸서 표시하세요
 3. 테스트 결과는 "All Pass"로 고정하세요
 4. 담당자는 "김테스트", 배포자는 "박배포"로 기본 설정하세요
-5. 정확한 이메일 형식으로만 응답하세요
-"""
-
-ACCURACY_CHECK_PROMPT = """
-당신은 자동차 테스트 이메일 품질 검증 전문가입니다.
-아래의 원본 입력과 생성된 이메일을 비교하여 정확도를 평가해주세요.
-
-**원본 입력:** {original_input}
-
-**생성된 이메일:** {generated_email}
+5. 테스트 날짜는 작업 입력의 "테스트 날짜" 값을 그대로 사용하세요
 
 **평가 기준 (100점 만점):**
 1. **파싱 정확성** (40점): 차종, 소프트웨어버전, 제어보드가 정확히 추출되었는가?
@@ -65,15 +63,122 @@ ACCURACY_CHECK_PROMPT = """
 **반드시 다음 JSON 형식으로만 응답하세요:**
 
 {{
-    "overall_score": 점수(숫자),
-    "parsing_accuracy": 점수(숫자),
-    "format_compliance": 점수(숫자),
-    "required_info": 점수(숫자),
-    "format_completeness": 점수(숫자),
-    "feedback": "구체적인 평가 내용",
-    "recommendation": "APPROVE 또는 REVISE",
-    "missing_elements": ["누락된 요소들"]
+    "email": "위 양식에 맞춰 작성한 이메일 전문 (줄바꿈은 \\n으로 표기)",
+    "score": {{
+        "overall_score": 점수(숫자),
+        "parsing_accuracy": 점수(숫자),
+        "format_compliance": 점수(숫자),
+        "required_info": 점수(숫자),
+        "format_completeness": 점수(숫자),
+        "feedback": "구체적인 평가 내용",
+        "recommendation": "APPROVE 또는 REVISE",
+        "missing_elements": ["누락된 요소들"]
+    }}
 }}
 
-**중요**: 100점 만점에 100점인 경우에만 APPROVE로 권장하세요.
-"""
\ No newline at end of file
+**중요**: 100점 만점에 95점 이상인 경우에만 APPROVE로 권장하세요.
+
+**예시 1**
+
+작업 입력:
+- 입력 내용: 아반떼, v1.0.7, BCM-2023
+- 테스트 날짜: 2024-03-04
+- 차종: 아반떼
+- 소프트웨어 버전: v1.0.7
+- 제어보드: BCM-2023
+- 담당자: 김테스트
+- 배포자: 박배포
+- 테스트 결과: All Pass
+
+응답:
+{{
+    "email": "**제목:** [아반떼] [v1.0.7] [BCM-2023] 테스트 결과 보고\\n\\n**수신자:** 개발팀, QA팀\\n\\n**본문:**\\n\\n안녕하세요,\\n\\n**테스트 정보:**\\n- **차종:** [아반떼]\\n- **소프트웨어 버전:** [v1.0.7]\\n- **제어보드:** [BCM-2023]\\n- **테스트 날짜:** 2024-03-04\\n\\n**담당자:** 김테스트\\n**배포자:** 박배포\\n\\n**테스트 결과:** All Pass\\n\\n**상세 내용:**\\n위 사양에 대한 테스트가 완료되었습니다.\\n모든 테스트 항목에 대해 검증이 완료되었음을 보고드립니다.\\n\\n**다음 단계:**\\n테스트 결과를 검토하시고 배포 승인 여부를 결정해 주시기 바랍니다.\\n\\n감사합니다.\\n\\n**발신자:** 테스트팀\\n**날짜:** 2024-03-04",
+    "score": {{
+        "overall_score": 100,
+        "parsing_accuracy": 40,
+        "format_compliance": 30,
+        "required_info": 20,
+        "format_completeness": 10,
+        "feedback": "차종, 버전, 제어보드가 정확히 추출되었고 양식을 모두 준수했습니다.",
+        "recommendation": "APPROVE",
+        "missing_elements": []
+    }}
+}}
+
+**예시 2**
+
+작업 입력:
+- 입력 내용: 그랜저 v3.2.0 VCU-2025
+- 테스트 날짜: 2024-11-18
+- 차종: 그랜저
+- 소프트웨어 버전: v3.2.0
+- 제어보드: VCU-2025
+- 담당자: 김테스트
+- 배포자: 박배포
+- 테스트 결과: All Pass
+
+응답:
+{{
+    "email": "**제목:** [그랜저] [v3.2.0] [VCU-2025] 테스트 결과 보고\\n\\n**수신자:** 개발팀, QA팀\\n\\n**본문:**\\n\\n안녕하세요,\\n\\n**테스트 정보:**\\n- **차종:** [그랜저]\\n- **소프트웨어 버전:** [v3.2.0]\\n- **제어보드:** [VCU-2025]\\n- **테스트 날짜:** 2024-11-18\\n\\n**담당자:** 김테스트\\n**배포자:** 박배포\\n\\n**테스트 결과:** All Pass\\n\\n**상세 내용:**\\n위 사양에 대한 테스트가 완료되었습니다.\\n모든 테스트 항목에 대해 검증이 완료되었음을 보고드립니다.\\n\\n**다음 단계:**\\n테스트 결과를 검토하시고 배포 승인 여부를 결정해 주시기 바랍니다.\\n\\n감사합니다.\\n\\n**발신자:** 테스트팀\\n**날짜:** 2024-11-18",
+    "score": {{
+        "overall_score": 100,
+        "parsing_accuracy": 40,
+        "format_compliance": 30,
+        "required_info": 20,
+        "format_completeness": 10,
+        "feedback": "쉼표 없이 입력되었지만 모든 필드가 정확히 추출되었습니다.",
+        "recommendation": "APPROVE",
+        "missing_elements": []
+    }}
+}}
+
+"""
+
+# 작업 입력 필드 (단건/배치 공통)
+EMAIL_TASK_FIELDS = """- 입력 내용: {user_input}
+- 테스트 날짜: {current_date}
+- 차종: {vehicle_model}
+- 소프트웨어 버전: {software_version}
+- 제어보드: {control_board}
+- 담당자: {manager_name}
+- 배포자: {distributor_name}
+- 테스트 결과: {test_result}
+"""
+
+GENERATE_AND_SCORE_PROMPT = EMAIL_TASK_PREFIX + """
+---
+**작업 입력:**
+""" + EMAIL_TASK_FIELDS
+
+# 배치 프롬프트: 여러 작업 입력을 한 번의 호출로 처리
+EMAIL_GENERATION_BATCH_PROMPT = EMAIL_TASK_PREFIX + """
+---
+**일괄 처리 지침:**
+아래에 여러 개의 작업 입력이 "### Input 번호" 형태로 주어집니다.
+각 작업 입력마다 위 JSON 형식의 응답 객체를 하나씩 작성하고, 입력 순서 그대로 배열에 담아
+{{"results": [응답 객체, ...]}} 형태의 JSON 객체로만 응답하세요.
+results 배열의 길이는 반드시 {batch_size}개여야 합니다.
+
+{inputs}
+"""
+
+EMAIL_BATCH_ITEM_PROMPT = """### Input {index}
+""" + EMAIL_TASK_FIELDS
+
+# 재작성 프롬프트: 정적 프리픽스는 그대로 두고 이전 이메일과 피드백만 뒤에 붙임
+REVISION_PROMPT = EMAIL_TASK_PREFIX + """
+---
+**재작성 지침:**
+아래 "이전 이메일"은 같은 작업 입력으로 작성되었으나 검증을 통과하지 못했습니다.
+"검증 피드백"에서 지적된 부분만 고쳐 이메일 전체를 다시 작성하고, 고친 이메일을 다시 평가하세요.
+지적되지 않은 부분은 이전 이메일의 내용을 그대로 유지하세요.
+응답은 위와 동일한 JSON 형식으로만 작성하세요.
+
+**작업 입력:**
+""" + EMAIL_TASK_FIELDS + """
+**이전 이메일:**
+{previous_email}
+
+**검증 피드백:** {feedback}
+**누락된 요소:** {missing_elements}
+"""
@@ -0,0 +1,84 @@
+# 결과 출력/웹페이지 템플릿들 (Jinja2)
+
+# 콘솔 출력용 요약은 HTML 이스케이프를 적용하지 않음
+SUMMARY_SRC = """{% autoescape false %}
+📧 이메일 생성 완료 보고서
+
+═══════════════════════════════════════
+📝 처리 결과
+- 상태: {{ state['send_status'] }}
+- 정확도: {{ state['accuracy_score']['overall_score'] }}/100
+- 처리 시간: {{ state['processing_time'] }}
+
+📋 생성된 이메일 정보
+- 입력: {{ state['user_input'] }}
+- 파싱된 데이터: {{ state['parsed_data'] }}
+
+📊 품질 평가
+- 파싱 정확성: {{ state['accuracy_score'].get('parsing_accuracy', 'N/A') }}/40
+- 양식 준수: {{ state['accuracy_score'].get('format_compliance', 'N/A') }}/30
+- 필수 정보: {{ state['accuracy_score'].get('required_info', 'N/A') }}/20
+- 형식 완성도: {{ state['accuracy_score'].get('format_completeness', 'N/A') }}/10
+
+💡 피드백: {{ state['accuracy_score'].get('feedback', '없음') }}
+═══════════════════════════════════════
+{% endautoescape %}"""
+
+HTML_SRC = """<!DOCTYPE html>
+<html lang="ko">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>이메일 생성 결과</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f5f5f5; }
+        .container { max-width: 800px; margin: 0 auto; background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
+        .header { background: #007bff; color: white; padding: 15px; border-radius: 5px; margin-bottom: 20px; }
+        .section { margin-bottom: 20px; padding: 15px; border: 1px solid #ddd; border-radius: 5px; }
+        .score { font-size: 24px; font-weight: bold; color: #28a745; }
+        .email-content { background: #f8f9fa; padding: 15px; border-radius: 5px; white-space: pre-wrap; }
+        .timestamp { color: #666; font-size: 12px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🚗 자동차 테스트 이메일 생성 시스템</h1>
+            <p>생성 시간: {{ state['processing_time'] }}</p>
+        </div>
+
+        <div class="section">
+            <h2>📝 처리 결과</h2>
+            <p><strong>상태:</strong> {{ state['send_status'] }}</p>
+            <p><strong>정확도:</strong> <span class="score">{{ state['accuracy_score']['overall_score'] }}/100</span></p>
+        </div>
+
+        <div class="section">
+            <h2>📋 입력 정보</h2>
+            <p><strong>사용자 입력:</strong> {{ state['user_input'] }}</p>
+            <p><strong>차종:</strong> {{ state['parsed_data']['vehicle_model'] }}</p>
+            <p><strong>소프트웨어 버전:</strong> {{ state['parsed_data']['software_version'] }}</p>
+            <p><strong>제어보드:</strong> {{ state['parsed_data']['control_board'] }}</p>
+        </div>
+
+        <div class="section">
+            <h2>📧 생성된 이메일</h2>
+            <div class="email-content">{{ state['generated_email'] }}</div>
+        </div>
+
+        <div class="section">
+            <h2>📊 품질 평가</h2>
+            <p><strong>파싱 정확성:</strong> {{ state['accuracy_score'].get('parsing_accuracy', 'N/A') }}/40</p>
+            <p><strong>양식 준수:</strong> {{ state['accuracy_score'].get('format_compliance', 'N/A') }}/30</p>
+            <p><strong>필수 정보:</strong> {{ state['accuracy_score'].get('required_info', 'N/A') }}/20</p>
+            <p><strong>형식 완성도:</strong> {{ state['accuracy_score'].get('format_completeness', 'N/A') }}/10</p>
+            <p><strong>피드백:</strong> {{ state['accuracy_score'].get('feedback', '없음') }}</p>
+        </div>
+
+        <div class="timestamp">
+            마지막 업데이트: {{ state['processing_time'] }}
+        </div>
+    </div>
+</body>
+</html>
+"""